@@ -6,9 +6,13 @@
 # modification: 2020/03/26
 # Enhanced error handling: 2026/01/04
 ########################################################################
-import smbus
+from smbus2 import SMBus, i2c_msg
+import statistics
+import struct
 import time
 import threading
+from collections import deque
+from contextlib import contextmanager, nullcontext
 from threading import Lock
 import logging
 
@@ -26,6 +30,9 @@ def numMap(value,fromLow,fromHigh,toLow,toHigh):
         logger.error(f"Error in numMap: {e}")
         return toLow
 
+# Servo pulse width (us) for every whole angle 0-180, i.e. numMap(a,0,180,500,2500)
+SERVO_LUT = tuple(int(round(500 + (2500-500)*a/180)) for a in range(181))
+
 class mDEV:
     CMD_SERVO1      =   0
     CMD_SERVO2      =   1
@@ -43,34 +50,158 @@ class mDEV:
     SERVO_MAX_PULSE_WIDTH = 2500
     SERVO_MIN_PULSE_WIDTH = 500
     SONIC_MAX_HIGH_BYTE = 50
+    # How many times a register write is re-sent after the bus raises OSError
+    # (0 = give up on the first error). A write that succeeds is sent once;
+    # reads have their own retry loop and ignore this.
+    RETRY_COUNT = 2
+    SONIC_SAMPLE_INTERVAL = 0.05  # background ultrasonic sampling period (20 Hz)
+    SONIC_MEDIAN_WINDOW = 5  # getSonic() reports the median of this many recent echoes
+    SONIC_STALE_AFTER = 0.5  # seconds without a good echo before getSonic() reports 0
 
     def __init__(self,addr=0x18):
         """Initialize the Smart Car Shield with error handling"""
         self.address = addr #default address of mDEV
         self.bus = None
-        self.mutex = Lock()
+        self._bus_lock = Lock()  # held only around the actual bus transactions
+        self._owner_tid = None  # thread inside exclusive(), which already holds _bus_lock
         self.Is_IO1_State_True = False
         self.Is_IO2_State_True = False
         self.Is_IO3_State_True = False
         self.Is_Buzzer_State_True = False
         self.handle = True
+        self._sonic_stop = threading.Event()
+        self._last_sonic_cm = 0.0
+        self._last_sonic_time = 0.0  # time.monotonic() of the last good median
+        self._last = {}  # last value successfully written to each register
 
         try:
-            self.bus = smbus.SMBus(1)
+            self.bus = SMBus(1)
             logger.info(f"Smart Car Shield initialized at I2C address 0x{self.address:02x}")
         except Exception as e:
             logger.error(f"Failed to initialize I2C bus: {e}")
             logger.error("Make sure the Smart Car Shield is properly connected and powered on")
             raise RuntimeError("I2C bus initialization failed") from e
+
+        # Keep the slow, retrying sonic read off the command path: a daemon
+        # thread refreshes the distance and getSonic() returns the latest one.
+        self._sonic_thread = threading.Thread(target=self._sonic_loop, name="Sonic Sampler", daemon=True)
+        self._sonic_thread.start()
+
+    def _sonic_loop(self):
+        """Refresh the cached ultrasonic distance until stopSonic() is called"""
+        # A median over the last few echoes ignores the odd spurious reading
+        # that would drag a mean off; failed reads (0) never enter the window.
+        window = deque(maxlen=self.SONIC_MEDIAN_WINDOW)
+        min_samples = self.SONIC_MEDIAN_WINDOW // 2 + 1
+        while self.handle and not self._sonic_stop.is_set():
+            try:
+                echo_time = self._readSonicEcho()
+                if echo_time:
+                    window.append(echo_time * 17.0 / 1000.0)
+                    if len(window) >= min_samples:
+                        self._last_sonic_cm = statistics.median(window)
+                        self._last_sonic_time = time.monotonic()
+                elif time.monotonic() - self._last_sonic_time > self.SONIC_STALE_AFTER:
+                    # Echoes from before a long gap say nothing about now
+                    window.clear()
+            except Exception as e:
+                logger.error(f"Error sampling sonic distance: {e}")
+            self._sonic_stop.wait(self.SONIC_SAMPLE_INTERVAL)
+
+    def _readSonicEcho(self):
+        """One echo-time read for the sampler; 0 when there is no usable echo"""
+        # Unlike readReg there is no retry loop: the sampler tries again on
+        # its next tick anyway, and an out-of-range echo just means nothing is
+        # within range, which is normal and not worth a warning.
+        msg_w = i2c_msg.write(self.address, [self.CMD_SONIC])
+        msg_r = i2c_msg.read(self.address, 2)
+        try:
+            with self._busLock():
+                self.bus.i2c_rdwr(msg_w, msg_r)
+        except OSError as e:
+            logger.debug(f"Sonic read failed: {e}")
+            return 0
+        hi, lo = list(msg_r)
+        if hi >= self.SONIC_MAX_HIGH_BYTE:
+            return 0
+        return hi<<8 | lo
+
+    def stopSonic(self):
+        """Stop the background ultrasonic sampler"""
+        self.handle = False
+        self._sonic_stop.set()
+        if self._sonic_thread.is_alive() and self._sonic_thread is not threading.current_thread():
+            self._sonic_thread.join(timeout=1.0)
+
+    @contextmanager
+    def exclusive(self):
+        """Hold the bus for a burst of I/O from the calling thread"""
+        if self._owner_tid == threading.get_ident():
+            yield self
+            return
+        with self._bus_lock:
+            self._owner_tid = threading.get_ident()
+            try:
+                yield self
+            finally:
+                self._owner_tid = None
+
+    def _busLock(self):
+        """The bus lock, or a no-op when this thread already holds it via exclusive()"""
+        if self._owner_tid == threading.get_ident():
+            return nullcontext()
+        return self._bus_lock
+
     def i2cRead(self,reg):
-        self.bus.read_byte_data(self.address,reg)
+        msg_r = i2c_msg.read(self.address, 1)
+        self.bus.i2c_rdwr(i2c_msg.write(self.address, [reg]), msg_r)
+        return list(msg_r)[0]
         
     def i2cWrite1(self,cmd,value):
-        self.bus.write_byte_data(self.address,cmd,value)
+        self.bus.i2c_rdwr(i2c_msg.write(self.address, [cmd, value]))
         
     def i2cWrite2(self,value):
-        self.bus.write_byte(self.address,value)
+        self.bus.i2c_rdwr(i2c_msg.write(self.address, [value]))
     
+    def _writeChanged(self,values):
+        """Write the (cmd, value) pairs that differ from _last as one I2C transaction"""
+        # The shield holds its registers, so repeating a value is a no-op.
+        # Each attempt compares against the cache, transfers and records
+        # under one hold of the bus lock, so another thread cannot skip its
+        # write against a value still in flight. A single transfer is enough;
+        # the I2C ACK/NACK tells us whether the shield took it, so only retry
+        # when the bus reports an error. The first retry is immediate, later
+        # ones back off exponentially with the lock released (unless the
+        # caller holds exclusive()), and each retry compares afresh.
+        for attempt in range(self.RETRY_COUNT + 1):
+            try:
+                with self._busLock():
+                    changed = {}
+                    for cmd, value in values:
+                        if self._last.get(cmd) != value:
+                            changed[cmd] = value
+                    if not changed:
+                        return
+                    try:
+                        # One I2C_RDWR ioctl: the messages go out back to back
+                        # with a repeated START instead of a STOP/START each.
+                        self.bus.i2c_rdwr(*[i2c_msg.write(self.address, struct.pack('>BH', cmd, value))
+                                            for cmd, value in changed.items()])
+                    except Exception:
+                        # Some of the registers may have taken the write; forget
+                        # them all so the next request is sent again.
+                        for cmd in changed:
+                            self._last.pop(cmd, None)
+                        raise
+                    self._last.update(changed)
+                return
+            except OSError as e:
+                if attempt == self.RETRY_COUNT:
+                    raise
+                logger.debug(f"I2C transfer attempt {attempt+1} failed: {e}")
+                if attempt:
+                    time.sleep(0.0001 * (2**attempt))
+
     def writeReg(self,cmd,value):
         """Write a register value to the shield with error handling"""
         if self.bus is None:
@@ -83,11 +214,7 @@ class mDEV:
                 logger.warning(f"Value {value} out of range (0-65535), clamping")
                 value = max(0, min(65535, value))
 
-            with self.mutex:
-                # Write the value multiple times for reliability (as per original design)
-                for _ in range(3):
-                    self.bus.write_i2c_block_data(self.address, cmd, [value>>8, value&0xff])
-                    time.sleep(0.001)
+            self._writeChanged([(cmd, value)])
             return True
         except ValueError as e:
             logger.error(f"Invalid value for register {cmd}: {value} - {e}")
@@ -96,64 +223,74 @@ class mDEV:
             logger.error(f"I2C write error for register {cmd}: {e}")
             return False
         
-    def readReg(self,cmd):
-        """Read a register value from the shield with error handling"""
+    def writeRegsBatch(self,pairs):
+        """Write several (cmd, value) registers in one I2C transaction"""
         if self.bus is None:
             logger.error("I2C bus not initialized")
-            return 0
+            return False
 
         try:
-            with self.mutex:
-                ##################################################################################################
-                #Due to the update of SMBus, the communication between Pi and the shield board is not normal.
-                #through the following code to improve the success rate of communication.
-                #But if there are conditions, the best solution is to update the firmware of the shield board.
-                ##################################################################################################
-                for i in range(0,10,1):
-                    try:
-                        self.bus.write_i2c_block_data(self.address,cmd,[0])
-                        a = self.bus.read_i2c_block_data(self.address,cmd,1)
+            values = []
+            for cmd, value in pairs:
+                value = int(value)
+                if not (0 <= value <= 65535):
+                    logger.warning(f"Value {value} out of range (0-65535), clamping")
+                    value = max(0, min(65535, value))
+                values.append((cmd, value))
 
-                        self.bus.write_byte(self.address,cmd+1)
-                        b = self.bus.read_i2c_block_data(self.address,cmd+1,1)
+            self._writeChanged(values)
+            return True
+        except ValueError as e:
+            logger.error(f"Invalid value in register batch {pairs}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"I2C batch write error for registers {[cmd for cmd, _ in pairs]}: {e}")
+            return False
 
-                        self.bus.write_byte(self.address,cmd)
-                        c = self.bus.read_byte_data(self.address,cmd)
+    def readReg(self,cmd):
+        """Read a register value from the shield with error handling"""
+        if self.bus is None:
+            logger.error("I2C bus not initialized")
+            return 0
 
-                        self.bus.write_byte(self.address,cmd+1)
-                        d = self.bus.read_byte_data(self.address,cmd+1)
+        try:
+            # Write the register pointer and read both bytes back in one
+            # combined transaction (S addr+W cmd Sr addr+R b0 b1 P), so the
+            # shield cannot drop the pointer between the write and the read.
+            # The bus lock is taken per attempt so writers can get in between
+            # the retries of a failing read.
+            for i in range(0,10,1):
+                try:
+                    msg_w = i2c_msg.write(self.address, [cmd])
+                    msg_r = i2c_msg.read(self.address, 2)
+                    with self._busLock():
+                        self.bus.i2c_rdwr(msg_w, msg_r)
+                    hi, lo = list(msg_r)
 
-                        if(a[0] == c and c < self.SONIC_MAX_HIGH_BYTE ):
-                            return c<<8 | d
-                        else:
-                            continue
-                    except Exception as e:
-                        logger.debug(f"I2C read attempt {i+1} failed: {e}")
-                        continue
+                    if hi < self.SONIC_MAX_HIGH_BYTE:
+                        return hi<<8 | lo
+                except Exception as e:
+                    logger.debug(f"I2C read attempt {i+1} failed: {e}")
 
-                logger.warning(f"Failed to read register {cmd} after 10 attempts")
-                return 0
+            logger.warning(f"Failed to read register {cmd} after 10 attempts")
+            return 0
         except Exception as e:
             logger.error(f"I2C read error for register {cmd}: {e}")
             return 0
     def move(self,left_pwm,right_pwm,steering_angle=100):
         """Move the car with specified PWM values and steering angle"""
         try:
-            self.setServo('1',steering_angle)
-            if left_pwm > 0:
-                self.writeReg(self.CMD_DIR2, 1)
-                self.writeReg(self.CMD_PWM2, left_pwm)
-            else:
-                self.writeReg(self.CMD_DIR2, 0)
-                self.writeReg(self.CMD_PWM2, abs(left_pwm))
-            if right_pwm > 0:
-                self.writeReg(self.CMD_DIR1, 1)
-                self.writeReg(self.CMD_PWM1, right_pwm)
-            else:
-                self.writeReg(self.CMD_DIR1, 0)
-                self.writeReg(self.CMD_PWM1, abs(right_pwm))
+            steering_angle = max(0, min(180, steering_angle))
+            return self.writeRegsBatch([
+                (self.CMD_SERVO1, SERVO_LUT[int(steering_angle)]),
+                (self.CMD_DIR2, 1 if left_pwm > 0 else 0),
+                (self.CMD_PWM2, abs(left_pwm)),
+                (self.CMD_DIR1, 1 if right_pwm > 0 else 0),
+                (self.CMD_PWM1, abs(right_pwm)),
+            ])
         except Exception as e:
             logger.error(f"Error in move function: {e}")
+            return False
 
     def setServo(self,index,angle):
         """Set servo position with error handling"""
@@ -163,7 +300,7 @@ class mDEV:
                 return False
 
             angle = max(0, min(180, angle))  # Clamp angle to valid range
-            pulse_width = numMap(angle, 0, 180, 500, 2500)
+            pulse_width = SERVO_LUT[int(angle)]
 
             if index == "1":
                 return self.writeReg(self.CMD_SERVO1, pulse_width)
@@ -188,23 +325,12 @@ class mDEV:
             G = bool(G)
             B = bool(B)
 
-            success = True
-            if R:
-                success &= self.writeReg(self.CMD_IO1, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO1, 1)
-
-            if G:
-                success &= self.writeReg(self.CMD_IO2, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO2, 1)
-
-            if B:
-                success &= self.writeReg(self.CMD_IO3, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO3, 1)
-
-            return success
+            # IO lines are active low; all three go out in one transaction
+            return self.writeRegsBatch([
+                (self.CMD_IO1, 0 if R else 1),
+                (self.CMD_IO2, 0 if G else 1),
+                (self.CMD_IO3, 0 if B else 1),
+            ])
         except Exception as e:
             logger.error(f"Error setting LED: {e}")
             return False
@@ -231,14 +357,10 @@ class mDEV:
             return 0
 
     def getSonic(self):
-        """Get ultrasonic distance in cm"""
-        try:
-            SonicEchoTime = self.readReg(self.CMD_SONIC)
-            distance = SonicEchoTime * 17.0 / 1000.0
-            return distance
-        except Exception as e:
-            logger.error(f"Error getting sonic distance: {e}")
+        """Get the latest sampled ultrasonic distance in cm, or 0 if it is stale"""
+        if time.monotonic() - self._last_sonic_time > self.SONIC_STALE_AFTER:
             return 0.0
+        return self._last_sonic_cm
 
     def setShieldI2cAddress(self,addr): #addr: 7bit I2C Device Address
         """Set new I2C address for the shield"""
@@ -253,8 +375,7 @@ class mDEV:
             logger.error(f"Error setting I2C address: {e}")
             return False
             
-mdev = mDEV()   
-def loop(): 
+def loop(mdev):
     mdev.readReg(mdev.CMD_SONIC)
     while True:
         SonicEchoTime = mdev.readReg(mdev.CMD_SONIC)
@@ -266,22 +387,22 @@ if __name__ == '__main__':
     import sys
     print("mDev.py is starting ... ")
     #setup()
+    # Only open the bus when run as a script; importers create their own mDEV
+    mdev = mDEV()
     try:
         if len(sys.argv)<2:
             print("Parameter error: Please assign the device")
             exit() 
         print(sys.argv[0],sys.argv[1])
         if sys.argv[1] == "servo":      
+            sweep = SERVO_LUT[50:140] + SERVO_LUT[140:50:-1]
             cnt = 3 
             while (cnt != 0):       
                 cnt = cnt - 1
-                for i in range(50,140,1):   
-                    mdev.writeReg(mdev.CMD_SERVO1,numMap(i,0,180,500,2500))
-                    time.sleep(0.005)
-                for i in range(140,50,-1):  
-                    mdev.writeReg(mdev.CMD_SERVO1,numMap(i,0,180,500,2500))
+                for pulse_width in sweep:
+                    mdev.writeReg(mdev.CMD_SERVO1,pulse_width)
                     time.sleep(0.005)
-            mdev.writeReg(mdev.CMD_SERVO1,numMap(100,0,180,500,2500))
+            mdev.writeReg(mdev.CMD_SERVO1,SERVO_LUT[100])
         if sys.argv[1] == "buzzer":
             mdev.writeReg(mdev.CMD_BUZZER,2000)
             time.sleep(3)
@@ -308,27 +429,16 @@ if __name__ == '__main__':
                 print("Sonic: ",mdev.getSonic())
                 time.sleep(0.1)
         if sys.argv[1] == "motor":
-                mdev.writeReg(mdev.CMD_DIR1,0)
-                mdev.writeReg(mdev.CMD_DIR2,0)
-                for i in range(0,1000,10):  
-                    mdev.writeReg(mdev.CMD_PWM1,i)
-                    mdev.writeReg(mdev.CMD_PWM2,i)
-                    time.sleep(0.005)
-                time.sleep(1)
-                for i in range(1000,0,-10): 
-                    mdev.writeReg(mdev.CMD_PWM1,i)
-                    mdev.writeReg(mdev.CMD_PWM2,i)
-                    time.sleep(0.005)
-                mdev.writeReg(mdev.CMD_DIR1,1)
-                mdev.writeReg(mdev.CMD_DIR2,1)
-                for i in range(0,1000,10):  
-                    mdev.writeReg(mdev.CMD_PWM1,i)
-                    mdev.writeReg(mdev.CMD_PWM2,i)
-                    time.sleep(0.005)
-                time.sleep(1)
-                for i in range(1000,0,-10): 
-                    mdev.writeReg(mdev.CMD_PWM1,i)
-                    mdev.writeReg(mdev.CMD_PWM2,i)
-                    time.sleep(0.005)
+                ramp_up = [[(mdev.CMD_PWM1,i),(mdev.CMD_PWM2,i)] for i in range(0,1000,10)]
+                ramp_down = [[(mdev.CMD_PWM1,i),(mdev.CMD_PWM2,i)] for i in range(1000,0,-10)]
+                for direction in (0,1):
+                    mdev.writeRegsBatch([(mdev.CMD_DIR1,direction),(mdev.CMD_DIR2,direction)])
+                    for pwm_pair in ramp_up:
+                        mdev.writeRegsBatch(pwm_pair)
+                        time.sleep(0.005)
+                    time.sleep(1)
+                    for pwm_pair in ramp_down:
+                        mdev.writeRegsBatch(pwm_pair)
+                        time.sleep(0.005)
     except KeyboardInterrupt:
         pass
\ No newline at end of file
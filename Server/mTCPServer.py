@@ -1,4 +1,6 @@
 import logging
+import re
+import selectors
 from socket import *
 import threading
 from Command import COMMAND as cmd
@@ -7,7 +9,7 @@ from mDev import *
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Initialize mDEV with error handling
+# Initialize the shared mDEV with error handling
 try:
     mdev = mDEV()
 except Exception as e:
@@ -18,12 +20,35 @@ except Exception as e:
 class mTCPServer(threading.Thread):
     HOST = ''
     PORT = 12345
-    BUFSIZ = 1024
+    BUFSIZ = 4096
     ADDR = (HOST, PORT)
+    # A command fragment is its name (e.g. "Move Forward") plus an optional value
+    CMD_RE = re.compile(r"\s*([A-Za-z][A-Za-z ]*[A-Za-z])\D*(\d*)")
 
     def __init__(self):
         super(mTCPServer, self).__init__()
         self.setName("TCP Server")
+        self.handlers = {
+            # Movement commands
+            cmd.CMD_FORWARD[1:]: self.handleForward,
+            cmd.CMD_BACKWARD[1:]: self.handleBackward,
+            cmd.CMD_STOP[1:]: self.handleStop,
+            # Steering commands
+            cmd.CMD_TURN_LEFT[1:]: self.handleTurnLeft,
+            cmd.CMD_TURN_RIGHT[1:]: self.handleTurnRight,
+            cmd.CMD_TURN_CENTER[1:]: self.handleTurnCenter,
+            # Camera commands
+            cmd.CMD_CAMERA_LEFT[1:]: self.handleCameraLeft,
+            cmd.CMD_CAMERA_RIGHT[1:]: self.handleCameraRight,
+            cmd.CMD_CAMERA_UP[1:]: self.handleCameraUp,
+            cmd.CMD_CAMERA_DOWN[1:]: self.handleCameraDown,
+            # Buzzer, LED and ultrasonic commands
+            cmd.CMD_BUZZER_ALARM[1:]: self.handleBuzzer,
+            cmd.CMD_RGB_R[1:]: self.handleLedRed,
+            cmd.CMD_RGB_G[1:]: self.handleLedGreen,
+            cmd.CMD_RGB_B[1:]: self.handleLedBlue,
+            cmd.CMD_ULTRASONIC[1:]: self.handleUltrasonic,
+        }
 
     def run(self):
         self.startTCPServer()
@@ -31,133 +56,146 @@ class mTCPServer(threading.Thread):
 
     def startTCPServer(self):
         self.sock = socket(AF_INET, SOCK_STREAM)
+        self.sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
         self.sock.bind(self.ADDR)
-        self.sock.listen(1)
+        self.sock.listen(8)
+        self.sock.setblocking(False)
+        self.selector = selectors.DefaultSelector()
+        self.selector.register(self.sock, selectors.EVENT_READ)
+        self.clients = {}  # client socket -> bytes received after its last ">"
         print("TCP Server started on port", self.PORT)
 
     def tcpLink(self):
-        while True:
-            print("Waiting for connection...")
+        view = memoryview(bytearray(self.BUFSIZ))
+        print("Waiting for connection...")
+        while self.sock.fileno() != -1:
             try:
-                self.tcpClientSock, self.addr = self.sock.accept()
-                print("Connected from", self.addr)
+                events = self.selector.select(timeout=1.0)
             except Exception as e:
                 print("Socket error:", e)
                 break
 
-            while True:
-                try:
-                    data = self.tcpClientSock.recv(self.BUFSIZ).decode('utf-8')
-                except Exception as e:
-                    print("Receive error:", e)
-                    self.tcpClientSock.close()
-                    break
-
-                if not data:
-                    break
-
-                commands = data.split(">")
-                for cmd_str in commands:
-                    if not cmd_str:
-                        continue
-
-                    # Movement commands
-                    if cmd.CMD_FORWARD[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_DIR1, 1)
-                        mdev.writeReg(mdev.CMD_DIR2, 1)
-                        mdev.writeReg(mdev.CMD_PWM1, value*10)
-                        mdev.writeReg(mdev.CMD_PWM2, value*10)
-
-                    elif cmd.CMD_BACKWARD[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_DIR1, 0)
-                        mdev.writeReg(mdev.CMD_DIR2, 0)
-                        mdev.writeReg(mdev.CMD_PWM1, value*10)
-                        mdev.writeReg(mdev.CMD_PWM2, value*10)
-
-                    elif cmd.CMD_STOP[1:] in cmd_str:
-                        mdev.writeReg(mdev.CMD_PWM1, 0)
-                        mdev.writeReg(mdev.CMD_PWM2, 0)
-
-                    # Steering commands
-                    elif cmd.CMD_TURN_LEFT[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO1, numMap(100+value, 0, 180, 500, 2500))
-
-                    elif cmd.CMD_TURN_RIGHT[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO1, numMap(100-value, 0, 180, 500, 2500))
-
-                    elif cmd.CMD_TURN_CENTER[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO1, numMap(value, 0, 180, 500, 2500))
-
-                    # Camera commands
-                    elif cmd.CMD_CAMERA_LEFT[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO2, numMap(value, 0, 180, 500, 2500))
-
-                    elif cmd.CMD_CAMERA_RIGHT[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO2, numMap(180-value, 0, 180, 500, 2500))
-
-                    elif cmd.CMD_CAMERA_UP[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO3, numMap(value, 0, 180, 500, 2500))
-
-                    elif cmd.CMD_CAMERA_DOWN[1:] in cmd_str:
-                        value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                        mdev.writeReg(mdev.CMD_SERVO3, numMap(180-value, 0, 180, 500, 2500))
-
-                    # Buzzer command
-                    elif cmd.CMD_BUZZER_ALARM[1:] in cmd_str:
-                        try:
-                            value = int("0" + "".join(filter(str.isdigit, cmd_str)))
-                            mdev.writeReg(mdev.CMD_BUZZER, 2000 if value != 0 else 0)
-                        except:
-                            # Toggle buzzer
-                            if hasattr(mdev, 'Is_Buzzer_State_True') and mdev.Is_Buzzer_State_True:
-                                mdev.Is_Buzzer_State_True = False
-                                mdev.writeReg(mdev.CMD_BUZZER, 0)
-                            else:
-                                mdev.Is_Buzzer_State_True = True
-                                mdev.writeReg(mdev.CMD_BUZZER, 2000)
-
-                    # LED commands
-                    elif cmd.CMD_RGB_R[1:] in cmd_str:
-                        if hasattr(mdev, 'Is_IO1_State_True') and mdev.Is_IO1_State_True:
-                            mdev.Is_IO1_State_True = False
-                            mdev.writeReg(mdev.CMD_IO1, 0)
-                        else:
-                            mdev.Is_IO1_State_True = True
-                            mdev.writeReg(mdev.CMD_IO1, 1)
-
-                    elif cmd.CMD_RGB_G[1:] in cmd_str:
-                        if hasattr(mdev, 'Is_IO2_State_True') and mdev.Is_IO2_State_True:
-                            mdev.Is_IO2_State_True = False
-                            mdev.writeReg(mdev.CMD_IO2, 0)
-                        else:
-                            mdev.Is_IO2_State_True = True
-                            mdev.writeReg(mdev.CMD_IO2, 1)
-
-                    elif cmd.CMD_RGB_B[1:] in cmd_str:
-                        if hasattr(mdev, 'Is_IO3_State_True') and mdev.Is_IO3_State_True:
-                            mdev.Is_IO3_State_True = False
-                            mdev.writeReg(mdev.CMD_IO3, 0)
-                        else:
-                            mdev.Is_IO3_State_True = True
-                            mdev.writeReg(mdev.CMD_IO3, 1)
-
-                    # Ultrasonic command
-                    elif cmd.CMD_ULTRASONIC[1:] in cmd_str:
-                        distance = mdev.getSonic()
-                        self.sendData(str(distance))
+            for key, _ in events:
+                if key.fileobj is self.sock:
+                    self.acceptClient()
+                else:
+                    self.readClient(key.fileobj, view)
+
+    def acceptClient(self):
+        try:
+            client, addr = self.sock.accept()
+        except BlockingIOError:
+            return
+        except Exception as e:
+            print("Socket error:", e)
+            return
+        print("Connected from", addr)
+        client.setblocking(False)
+        # Replies are tiny; don't let Nagle hold them back waiting for an ACK
+        client.setsockopt(IPPROTO_TCP, TCP_NODELAY, 1)
+        self.clients[client] = bytearray()
+        self.selector.register(client, selectors.EVENT_READ)
+
+    def closeClient(self, client):
+        self.selector.unregister(client)
+        self.clients.pop(client, None)
+        client.close()
+
+    def readClient(self, client, view):
+        try:
+            nbytes = client.recv_into(view)
+        except BlockingIOError:
+            return
+        except Exception as e:
+            print("Receive error:", e)
+            self.closeClient(client)
+            return
+
+        if not nbytes:
+            self.closeClient(client)
+            return
+
+        pending = self.clients[client] + view[:nbytes]
+        *commands, pending = pending.split(b">")
+        # A short read means the socket is drained, so the tail is a
+        # whole command; a full read may have cut it, so keep it for later.
+        if nbytes < len(view):
+            commands.append(pending)
+            pending = bytearray()
+        self.clients[client] = pending
+
+        # Replies such as the ultrasonic distance go back to this client
+        self.tcpClientSock = client
+        # Take the bus once for the whole packet instead of once per register
+        with mdev.exclusive():
+            for cmd_bytes in commands:
+                self.handleCommand(cmd_bytes.decode('utf-8', 'ignore'))
+
+    def handleCommand(self, cmd_str):
+        match = self.CMD_RE.match(cmd_str)
+        if not match:
+            return
+        handler = self.handlers.get(match.group(1))
+        if handler:
+            handler(int(match.group(2) or 0))
+
+    def handleForward(self, value):
+        mdev.writeRegsBatch([(mdev.CMD_DIR1, 1), (mdev.CMD_DIR2, 1),
+                             (mdev.CMD_PWM1, value*10), (mdev.CMD_PWM2, value*10)])
+
+    def handleBackward(self, value):
+        mdev.writeRegsBatch([(mdev.CMD_DIR1, 0), (mdev.CMD_DIR2, 0),
+                             (mdev.CMD_PWM1, value*10), (mdev.CMD_PWM2, value*10)])
+
+    def handleStop(self, value):
+        mdev.writeRegsBatch([(mdev.CMD_PWM1, 0), (mdev.CMD_PWM2, 0)])
+
+    def handleTurnLeft(self, value):
+        mdev.writeReg(mdev.CMD_SERVO1, SERVO_LUT[max(0, min(180, 100+value))])
+
+    def handleTurnRight(self, value):
+        mdev.writeReg(mdev.CMD_SERVO1, SERVO_LUT[max(0, min(180, 100-value))])
+
+    def handleTurnCenter(self, value):
+        mdev.writeReg(mdev.CMD_SERVO1, SERVO_LUT[max(0, min(180, value))])
+
+    def handleCameraLeft(self, value):
+        mdev.writeReg(mdev.CMD_SERVO2, SERVO_LUT[max(0, min(180, value))])
+
+    def handleCameraRight(self, value):
+        mdev.writeReg(mdev.CMD_SERVO2, SERVO_LUT[max(0, min(180, 180-value))])
+
+    def handleCameraUp(self, value):
+        mdev.writeReg(mdev.CMD_SERVO3, SERVO_LUT[max(0, min(180, value))])
+
+    def handleCameraDown(self, value):
+        mdev.writeReg(mdev.CMD_SERVO3, SERVO_LUT[max(0, min(180, 180-value))])
+
+    def handleBuzzer(self, value):
+        mdev.writeReg(mdev.CMD_BUZZER, 2000 if value != 0 else 0)
+
+    def toggleIO(self, state_attr, reg):
+        state = not getattr(mdev, state_attr)
+        setattr(mdev, state_attr, state)
+        mdev.writeReg(reg, 1 if state else 0)
+
+    def handleLedRed(self, value):
+        self.toggleIO('Is_IO1_State_True', mdev.CMD_IO1)
+
+    def handleLedGreen(self, value):
+        self.toggleIO('Is_IO2_State_True', mdev.CMD_IO2)
+
+    def handleLedBlue(self, value):
+        self.toggleIO('Is_IO3_State_True', mdev.CMD_IO3)
+
+    def handleUltrasonic(self, value):
+        distance = mdev.getSonic()
+        self.sendData(str(distance))
 
     def stopTCPServer(self):
         try:
-            if hasattr(self, 'tcpClientSock'):
-                self.tcpClientSock.close()
+            for client in list(getattr(self, 'clients', {})):
+                self.closeClient(client)
             if hasattr(self, 'sock'):
                 self.sock.close()
         except Exception as e:
@@ -7,6 +7,7 @@
 ########################################################################
 import time
 import logging
+from contextlib import contextmanager
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -22,6 +23,9 @@ def numMap(value, fromLow, fromHigh, toLow, toHigh):
         logger.error(f"Error in numMap: {e}")
         return toLow
 
+# Servo pulse width (us) for every whole angle 0-180, i.e. numMap(a, 0, 180, 500, 2500)
+SERVO_LUT = tuple(int(round(500 + (2500 - 500) * a / 180)) for a in range(181))
+
 class mDEV:
     CMD_SERVO1 = 0
     CMD_SERVO2 = 1
@@ -44,7 +48,7 @@ class mDEV:
         """Initialize the mock Smart Car Shield"""
         self.address = addr
         self.bus = None
-        self.mutex = None  # No threading in mock
+        self._bus_lock = None  # No threading in mock
         self.Is_IO1_State_True = False
         self.Is_IO2_State_True = False
         self.Is_IO3_State_True = False
@@ -70,6 +74,11 @@ class mDEV:
 
         logger.info(f"Mock Smart Car Shield initialized (no hardware)")
 
+    @contextmanager
+    def exclusive(self):
+        """Mock bus hold - nothing to lock"""
+        yield self
+
     def writeReg(self, cmd, value):
         """Mock register write - just store the value"""
         try:
@@ -79,17 +88,26 @@ class mDEV:
                 value = max(0, min(65535, value))
 
             self.registers[cmd] = value
-            logger.debug(f"Mock write: register {cmd} = {value}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Mock write: register %d = %d", cmd, value)
             return True
         except Exception as e:
             logger.error(f"Mock write error for register {cmd}: {e}")
             return False
 
+    def writeRegsBatch(self, pairs):
+        """Mock batched register write - store each value in order"""
+        success = True
+        for cmd, value in pairs:
+            success &= self.writeReg(cmd, value)
+        return success
+
     def readReg(self, cmd):
         """Mock register read - return stored value"""
         try:
             value = self.registers.get(cmd, 0)
-            logger.debug(f"Mock read: register {cmd} = {value}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Mock read: register %d = %d", cmd, value)
             return value
         except Exception as e:
             logger.error(f"Mock read error for register {cmd}: {e}")
@@ -103,7 +121,7 @@ class mDEV:
                 return False
 
             angle = max(0, min(180, angle))  # Clamp angle to valid range
-            pulse_width = numMap(angle, 0, 180, 500, 2500)
+            pulse_width = SERVO_LUT[int(angle)]
 
             if index == "1":
                 return self.writeReg(self.CMD_SERVO1, pulse_width)
@@ -146,46 +164,35 @@ class mDEV:
             logger.error(f"Error getting mock sonic distance: {e}")
             return 0.0
 
+    def stopSonic(self):
+        """Mock has no background sampler; just mark the device as stopped"""
+        self.handle = False
+
     # Additional methods for compatibility
     def move(self, left_pwm, right_pwm, steering_angle=100):
         """Move the car with specified PWM values and steering angle"""
         try:
-            self.setServo('1', steering_angle)
-            if left_pwm > 0:
-                self.writeReg(self.CMD_DIR2, 1)
-                self.writeReg(self.CMD_PWM2, left_pwm)
-            else:
-                self.writeReg(self.CMD_DIR2, 0)
-                self.writeReg(self.CMD_PWM2, abs(left_pwm))
-            if right_pwm > 0:
-                self.writeReg(self.CMD_DIR1, 1)
-                self.writeReg(self.CMD_PWM1, right_pwm)
-            else:
-                self.writeReg(self.CMD_DIR1, 0)
-                self.writeReg(self.CMD_PWM1, abs(right_pwm))
+            steering_angle = max(0, min(180, steering_angle))
+            return self.writeRegsBatch([
+                (self.CMD_SERVO1, SERVO_LUT[int(steering_angle)]),
+                (self.CMD_DIR2, 1 if left_pwm > 0 else 0),
+                (self.CMD_PWM2, abs(left_pwm)),
+                (self.CMD_DIR1, 1 if right_pwm > 0 else 0),
+                (self.CMD_PWM1, abs(right_pwm)),
+            ])
         except Exception as e:
             logger.error(f"Error in mock move function: {e}")
+            return False
 
     def setLed(self, R, G, B):
         """Set RGB LED state with error handling"""
         try:
-            success = True
-            if R:
-                success &= self.writeReg(self.CMD_IO1, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO1, 1)
-
-            if G:
-                success &= self.writeReg(self.CMD_IO2, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO2, 1)
-
-            if B:
-                success &= self.writeReg(self.CMD_IO3, 0)
-            else:
-                success &= self.writeReg(self.CMD_IO3, 1)
-
-            return success
+            # IO lines are active low
+            return self.writeRegsBatch([
+                (self.CMD_IO1, 0 if R else 1),
+                (self.CMD_IO2, 0 if G else 1),
+                (self.CMD_IO3, 0 if B else 1),
+            ])
         except Exception as e:
             logger.error(f"Error setting mock LED: {e}")
             return False
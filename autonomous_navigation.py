@@ -14,6 +14,7 @@ import threading
 import time
 
 import cv2
+import numpy as np
 
 from lib.movement import CarControl
 
@@ -31,8 +32,7 @@ class LatestFrameCamera:
         self.height = height
         self.capture = None
         self.thread = None
-        self.running = False
-        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
         self.latest_frame = None
 
     def start(self):
@@ -48,33 +48,32 @@ class LatestFrameCamera:
         self.capture.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
         self.capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
 
-        self.running = True
+        self.stop_event.clear()
         self.thread = threading.Thread(target=self._reader_loop, daemon=True)
         self.thread.start()
 
     def _reader_loop(self):
         try:
-            while self.running:
+            while not self.stop_event.is_set():
                 success, frame = self.capture.read()
                 if not success:
-                    time.sleep(0.05)
+                    self.stop_event.wait(0.05)
                     continue
 
-                with self.lock:
-                    self.latest_frame = frame
+                # Each read returns a fresh array, so publishing it is a
+                # single reference swap that readers can pick up unlocked.
+                self.latest_frame = frame
         finally:
             if self.capture is not None:
                 self.capture.release()
                 self.capture = None
 
     def read(self):
-        with self.lock:
-            if self.latest_frame is None:
-                return None
-            return self.latest_frame.copy()
+        """Return the newest frame; callers must treat it as read-only."""
+        return self.latest_frame
 
     def stop(self):
-        self.running = False
+        self.stop_event.set()
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=1.0)
 
@@ -115,8 +114,10 @@ class CameraNavigator:
         reverse_speed=25,
         stop_threshold=78.0,
         turn_margin=6.0,
+        stop_event=None,
     ):
         self.car = car
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
         self.cruise_speed = cruise_speed
         self.reverse_speed = reverse_speed
         self.stop_threshold = stop_threshold
@@ -124,38 +125,51 @@ class CameraNavigator:
         self.center_angle = 100
         self.left_angle = 70
         self.right_angle = 130
+        # Every driving action except "recover" is cruise-forward at some steering angle
+        self.action_angles = {
+            "left": self.left_angle,
+            "forward": self.center_angle,
+            "right": self.right_angle,
+        }
+        # Working images for score_frame, reused across frames so the OpenCV
+        # calls write in place instead of allocating new arrays every frame.
+        self.small_frame = np.empty((240, 320, 3), dtype=np.uint8)
+        self.gray = np.empty((240, 320), dtype=np.uint8)
+        self.blurred = np.empty((240, 320), dtype=np.uint8)
+        self.edges = np.empty((240, 320), dtype=np.uint8)
+        # The working size is fixed, so the zone geometry is too: the lower
+        # part of the frame where obstacles matter, split into thirds.
+        self.lower_y = int(240 * 0.45)
+        third = 320 // 3
+        self.zone_starts = np.array([0, third, third * 2])
+        self.zone_pixels = np.diff(self.zone_starts, append=320) * (240 - self.lower_y)
+        self.last_action = None
 
     def score_frame(self, frame):
         """Return a simple free-space score for left, center, and right zones."""
-        frame = cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        gray = cv2.GaussianBlur(gray, (7, 7), 0)
-        edges = cv2.Canny(gray, 50, 150)
+        frame = cv2.resize(frame, (320, 240), dst=self.small_frame, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+        gray = cv2.GaussianBlur(self.gray, (7, 7), 0, dst=self.blurred)
+        edges = cv2.Canny(gray, 50, 150, edges=self.edges)
 
         # Focus on the lower half of the frame where obstacles are most relevant.
-        lower_y = int(gray.shape[0] * 0.45)
-        gray = gray[lower_y:, :]
-        edges = edges[lower_y:, :]
-
-        third = gray.shape[1] // 3
-        zones = {
-            "left": (slice(None), slice(0, third)),
-            "center": (slice(None), slice(third, third * 2)),
-            "right": (slice(None), slice(third * 2, gray.shape[1])),
-        }
+        gray = gray[self.lower_y:, :]
+        edges = edges[self.lower_y:, :]
 
-        scores = {}
-        for name, (ys, xs) in zones.items():
-            gray_roi = gray[ys, xs]
-            edge_roi = edges[ys, xs]
+        # Sum each column once, then fold the columns into the left/center/right
+        # zones with a single reduction instead of scoring each zone in turn.
+        starts = self.zone_starts
+        pixels = self.zone_pixels
+        edge_means = np.add.reduceat(edges.sum(axis=0, dtype=np.uint32), starts) / pixels
+        gray_means = np.add.reduceat(gray.sum(axis=0, dtype=np.uint32), starts) / pixels
 
-            # Higher values mean more clutter, so we want to steer toward the
-            # lowest score.
-            edge_score = cv2.mean(edge_roi)[0] / 255.0 * 100.0
-            darkness_score = (255.0 - cv2.mean(gray_roi)[0]) / 255.0 * 100.0
-            scores[name] = (edge_score * 0.7) + (darkness_score * 0.3)
+        # Higher values mean more clutter, so we want to steer toward the
+        # lowest score.
+        edge_scores = edge_means / 255.0 * 100.0
+        darkness_scores = (255.0 - gray_means) / 255.0 * 100.0
+        zone_scores = (edge_scores * 0.7) + (darkness_scores * 0.3)
 
-        return scores
+        return dict(zip(("left", "center", "right"), zone_scores.tolist()))
 
     def choose_action(self, scores):
         ordered = sorted(scores.items(), key=lambda item: item[1])
@@ -175,26 +189,28 @@ class CameraNavigator:
         return "forward", best_name, confidence
 
     def execute(self, action):
-        if action == "left":
-            self.car.set_steering(self.left_angle)
-            self.car.forward()
-            self.car.set_speed(self.cruise_speed)
-        elif action == "right":
-            self.car.set_steering(self.right_angle)
-            self.car.forward()
-            self.car.set_speed(self.cruise_speed)
-        elif action == "recover":
+        if action == "recover":
+            # Wait on the stop event rather than sleeping so a shutdown
+            # request cuts the manoeuvre short instead of finishing it.
             self.car.stop()
-            time.sleep(0.2)
-            self.car.backward()
-            self.car.set_speed(self.reverse_speed)
-            time.sleep(0.35)
-            self.car.stop()
-            time.sleep(0.1)
-        else:
-            self.car.center_steering()
-            self.car.forward()
-            self.car.set_speed(self.cruise_speed)
+            if not self.stop_event.wait(0.2):
+                self.car.drive(self.reverse_speed, reverse=True)
+                self.stop_event.wait(0.35)
+                self.car.stop()
+                self.stop_event.wait(0.1)
+            self.last_action = action
+            return
+
+        # The car is already cruising with this steering angle; re-sending
+        # the same servo, direction and speed commands only costs bus time.
+        if action == self.last_action:
+            return
+
+        # Only remember the action once the car has taken it, so a failed
+        # bus write is retried on the next frame.
+        steered = self.car.set_steering(self.action_angles.get(action, self.center_angle))
+        driving = self.car.drive(self.cruise_speed)
+        self.last_action = action if steered and driving else None
 
 
 def parse_args():
@@ -211,11 +227,10 @@ def parse_args():
 
 def main():
     args = parse_args()
-    stop_requested = False
+    stop_event = threading.Event()
 
     def handle_signal(signum, frame):
-        nonlocal stop_requested
-        stop_requested = True
+        stop_event.set()
 
     signal.signal(signal.SIGINT, handle_signal)
     signal.signal(signal.SIGTERM, handle_signal)
@@ -242,30 +257,35 @@ def main():
             car=car,
             cruise_speed=args.speed,
             reverse_speed=args.reverse_speed,
+            stop_event=stop_event,
         )
 
         car.center_steering()
-        car.forward()
-        car.set_speed(args.speed)
+        car.drive(args.speed)
 
-        while not stop_requested:
+        # Pace the loop against a monotonic deadline so the 0.1 s cycle
+        # includes the time spent scoring the frame and driving the car.
+        while not stop_event.is_set():
+            deadline = time.monotonic() + 0.1
             frame = camera.read()
             if frame is None:
                 car.stop()
-                time.sleep(0.05)
+                navigator.last_action = None
+                stop_event.wait(0.05)
                 continue
 
             scores = navigator.score_frame(frame)
             action, best_zone, confidence = navigator.choose_action(scores)
             navigator.execute(action)
 
-            logger.debug(
-                "zones=%s best=%s confidence=%.1f action=%s",
-                {k: round(v, 1) for k, v in scores.items()},
-                best_zone,
-                confidence,
-                action,
-            )
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    "zones=%s best=%s confidence=%.1f action=%s",
+                    {k: round(v, 1) for k, v in scores.items()},
+                    best_zone,
+                    confidence,
+                    action,
+                )
 
             if args.show:
                 overlay = cv2.resize(frame, (320, 240), interpolation=cv2.INTER_AREA)
@@ -284,7 +304,7 @@ def main():
                 if cv2.waitKey(1) & 0xFF == ord("q"):
                     break
 
-            time.sleep(0.1)
+            stop_event.wait(max(0.0, deadline - time.monotonic()))
 
     except Exception as e:
         logger.error("Autonomous navigation failed: %s", e)
@@ -25,6 +25,7 @@ class FaceTrackerApp:
         self.running = False
         self.cap = None
         self.face_cascade = None
+        self.face_detector = None
         self.tracking_active = False
         self.face_found = False
         self.last_face_position = None
@@ -36,6 +37,36 @@ class FaceTrackerApp:
         self.detection_confidence = 1.1
         self.detection_neighbors = 5
         
+        # Optional YuNet CNN detector (int8 ONNX), used instead of the Haar
+        # cascade when the model file is present
+        self.yunet_model = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                        'models', 'face_detection_yunet_2023mar_int8.onnx')
+        self.yunet_score_threshold = 0.7
+        
+        # Faces are detected on a downscaled copy of each frame; the Haar
+        # detector's cost grows with pixel count, so this is the big win.
+        self.detect_size = (320, 240)
+        self.small_frame = np.empty((240, 320, 3), dtype=np.uint8)
+        self.gray = np.empty((240, 320), dtype=np.uint8)
+        # Display conversion target; OpenCV falls back to a new array if the
+        # camera ignores the requested 640x480
+        self.rgb_frame = np.empty((480, 640, 3), dtype=np.uint8)
+        
+        # Detection runs on its own thread at a lower rate than the display.
+        # The camera loop only fills small_frame while detect_ready is clear,
+        # and the detector only reads it while it is set.
+        self.detect_interval = 0.1  # ~10 detections per second
+        self.detect_ready = threading.Event()
+        self.latest_faces = ()
+        self.detect_thread = None
+        # Set to stop the current run; each run gets a fresh one so a loop
+        # from the previous run cannot carry on next to the new threads
+        self.stop_event = threading.Event()
+        
+        # Widget values last pushed by apply_ui_updates, so unchanged labels
+        # are not reconfigured every frame
+        self.ui_applied = {}
+        
         # Initialize OpenCV
         self.init_opencv()
         
@@ -48,8 +79,11 @@ class FaceTrackerApp:
     def init_opencv(self):
         """Initialize OpenCV and face detection"""
         try:
-            # Initialize camera
-            self.cap = cv2.VideoCapture(0)
+            # Initialize camera; CAP_V4L2 is the most reliable backend on Linux,
+            # but fall back to the default backend if it is not available
+            self.cap = cv2.VideoCapture(0, cv2.CAP_V4L2)
+            if not self.cap.isOpened():
+                self.cap = cv2.VideoCapture(0)
             if not self.cap.isOpened():
                 messagebox.showerror("Error", "Could not open camera")
                 self.root.quit()
@@ -59,6 +93,23 @@ class FaceTrackerApp:
             self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
             self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
             self.cap.set(cv2.CAP_PROP_FPS, 30)
+            # MJPEG halves USB bandwidth and decodes faster than raw YUYV, and a
+            # one-frame buffer keeps read() from handing back stale frames
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            self.cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+            
+            # Prefer the YuNet detector when its model is available, and fall
+            # back to the Haar cascade if this OpenCV build cannot load it
+            if os.path.exists(self.yunet_model) and hasattr(cv2, 'FaceDetectorYN'):
+                try:
+                    self.face_detector = cv2.FaceDetectorYN.create(
+                        self.yunet_model, "", self.detect_size,
+                        score_threshold=self.yunet_score_threshold, nms_threshold=0.3
+                    )
+                    return
+                except Exception as e:
+                    print(f"Could not load YuNet model, using Haar cascade: {e}")
+                    self.face_detector = None
             
             # Load face cascade
             cascade_path = cv2.data.haarcascades + 'haarcascade_frontalface_default.xml'
@@ -113,6 +164,10 @@ class FaceTrackerApp:
         self.video_canvas = tk.Canvas(video_frame, bg='black', width=640, height=480)
         self.video_canvas.pack(fill='both', expand=True, padx=5, pady=5)
         
+        # One PhotoImage and canvas item, repainted in place for every frame
+        self.photo = ImageTk.PhotoImage('RGB', (640, 480))
+        self.canvas_image = self.video_canvas.create_image(0, 0, anchor='nw', image=self.photo)
+        
         # Information panel
         info_frame = tk.LabelFrame(main_frame, text="Tracking Information", bg='#34495e', fg='white', font=('Arial', 12, 'bold'))
         info_frame.pack(fill='x', pady=(0, 10))
@@ -151,18 +206,33 @@ class FaceTrackerApp:
             self.face_count_label.config(text="Faces: 0")
             self.direction_label.config(text="Scanning...")
             self.progress_bar['value'] = 0
+            self.ui_applied.clear()
+            
+            # The old detector shares small_frame and gray with the new run,
+            # so let it finish first; it never touches Tk, so this is safe
+            # from the UI thread. The old camera loop exits on its own stop
+            # event after at most one more frame.
+            if self.detect_thread is not None:
+                self.detect_thread.join(timeout=1.0)
             
-            # Start camera thread
-            self.camera_thread = threading.Thread(target=self.camera_loop, daemon=True)
+            # Start camera and detection threads
+            self.stop_event = threading.Event()
+            self.latest_faces = ()
+            self.detect_ready.clear()
+            self.camera_thread = threading.Thread(target=self.camera_loop, args=(self.stop_event,), daemon=True)
             self.camera_thread.start()
+            self.detect_thread = threading.Thread(target=self.detection_loop, args=(self.stop_event,), daemon=True)
+            self.detect_thread.start()
         else:
             self.running = False
+            self.stop_event.set()
             self.tracking_active = False
             self.start_btn.config(text="Start Tracking", bg='#27ae60')
             self.status_label.config(text="Status: Idle")
             self.face_count_label.config(text="Faces: 0")
             self.direction_label.config(text="Stopped")
             self.progress_bar['value'] = 0
+            self.ui_applied.clear()
     
     def reset_tracking(self):
         """Reset tracking state"""
@@ -173,10 +243,11 @@ class FaceTrackerApp:
         self.position_label.config(text="Not Found")
         self.direction_label.config(text="Scanning...")
         self.status_label.config(text="Status: Active - Scanning for faces...")
+        self.ui_applied.clear()
     
-    def camera_loop(self):
+    def camera_loop(self, stop):
         """Main camera processing loop"""
-        while self.running:
+        while not stop.is_set():
             ret, frame = self.cap.read()
             if not ret:
                 break
@@ -184,29 +255,73 @@ class FaceTrackerApp:
             # Process frame for face detection
             processed_frame = self.process_frame(frame)
             
-            # Update UI with processed frame
+            # Update UI with processed frame; read() blocks until the next
+            # frame, so the camera's 30 FPS paces this loop
             self.update_video_display(processed_frame)
+    
+    def detection_loop(self, stop):
+        """Detect faces in the newest downscaled frame at a fixed cadence"""
+        while not stop.is_set():
+            if not self.detect_ready.wait(0.1):
+                continue
+            start = time.monotonic()
             
-            # Small delay to prevent overwhelming the system
-            time.sleep(0.03)  # ~30 FPS
+            if self.face_detector is not None:
+                faces = self.detect_faces_yunet()
+            else:
+                cv2.cvtColor(self.small_frame, cv2.COLOR_BGR2GRAY, dst=self.gray)
+                faces = self.face_cascade.detectMultiScale(
+                    self.gray,
+                    scaleFactor=self.detection_confidence,
+                    minNeighbors=self.detection_neighbors,
+                    minSize=self.detect_min_size,
+                    maxSize=self.detect_max_size
+                )
+            if stop.is_set():
+                break
+            # Swap in the new result; the camera loop reads it without locking
+            self.latest_faces = faces
+            self.detect_ready.clear()
+            
+            stop.wait(max(0.0, self.detect_interval - (time.monotonic() - start)))
+    
+    def detect_faces_yunet(self):
+        """Run YuNet on the downscaled frame and return (x, y, w, h) boxes"""
+        _, detections = self.face_detector.detect(self.small_frame)
+        if detections is None:
+            return ()
+        
+        # Each row is a box, five landmarks and a score; keep the boxes and
+        # apply the same size limits as the Haar path
+        boxes = detections[:, :4].astype(np.int32)
+        widths = boxes[:, 2]
+        keep = (widths >= self.detect_min_size[0]) & (widths <= self.detect_max_size[0])
+        return boxes[keep]
     
     def process_frame(self, frame):
         """Process a single frame for face detection and tracking"""
-        # Convert to grayscale for face detection
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Detect faces
-        faces = self.face_cascade.detectMultiScale(
-            gray,
-            scaleFactor=self.detection_confidence,
-            minNeighbors=self.detection_neighbors,
-            minSize=self.min_face_size,
-            maxSize=self.max_face_size
-        )
+        scale_x = frame.shape[1] / self.detect_size[0]
+        scale_y = frame.shape[0] / self.detect_size[1]
+        frame_center = (frame.shape[1] // 2, frame.shape[0] // 2)
+        
+        # Hand the detector a downscaled copy whenever it is ready for one,
+        # before any overlays are drawn onto the frame
+        if not self.detect_ready.is_set():
+            cv2.resize(frame, self.detect_size, dst=self.small_frame, interpolation=cv2.INTER_AREA)
+            # Size limits are given for the full frame; map them into the small one
+            self.detect_min_size = (int(self.min_face_size[0] / scale_x), int(self.min_face_size[1] / scale_y))
+            self.detect_max_size = (int(self.max_face_size[0] / scale_x), int(self.max_face_size[1] / scale_y))
+            self.detect_ready.set()
+        
+        # Use the most recent detection result
+        faces = self.latest_faces
+        
+        # Widget updates for this frame, handed to the Tk thread in one batch
+        ui = {}
         
         # Update face count
         face_count = len(faces)
-        self.root.after(0, lambda: self.face_count_label.config(text=f"Faces: {face_count}"))
+        ui['face_count_label'] = f"Faces: {face_count}"
         
         # Draw detection results
         if face_count > 0:
@@ -214,6 +329,10 @@ class FaceTrackerApp:
             largest_face = max(faces, key=lambda f: f[2] * f[3])
             x, y, w, h = largest_face
             
+            # Map the box back onto the full-size frame
+            x, w = int(x * scale_x), int(w * scale_x)
+            y, h = int(y * scale_y), int(h * scale_y)
+            
             # Calculate face center
             face_center_x = x + w // 2
             face_center_y = y + h // 2
@@ -224,7 +343,7 @@ class FaceTrackerApp:
                 self.face_found = True
                 self.last_face_position = current_face_center
                 self.face_center = current_face_center
-                self.root.after(0, lambda: self.status_label.config(text="Status: Face Detected - Locking On..."))
+                ui['status_label'] = "Status: Face Detected - Locking On..."
             
             # Update face center with smoothing
             if self.face_center:
@@ -242,18 +361,18 @@ class FaceTrackerApp:
             cv2.circle(frame, self.face_center, 5, (0, 0, 255), -1)
             
             # Draw tracking lines
-            frame_center = (frame.shape[1] // 2, frame.shape[0] // 2)
             cv2.line(frame, frame_center, self.face_center, (255, 255, 255), 1, cv2.LINE_AA)
             
-            # Calculate direction and update UI
+            # Calculate direction and distance from center
             direction = self.calculate_direction(self.face_center, frame_center)
-            self.root.after(0, lambda d=direction: self.update_direction_info(d, self.face_center, frame_center))
+            distance = ((self.face_center[0] - frame_center[0])**2 + (self.face_center[1] - frame_center[1])**2)**0.5
+            ui['direction_label'] = f"Direction: {direction}"
+            ui['position_label'] = f"Position: ({self.face_center[0]}, {self.face_center[1]}) - Distance: {int(distance)}px"
             
             # Update progress bar (face size indicates distance)
             face_size = w * h
             max_face_size = 640 * 480 * 0.3  # 30% of screen area
-            progress = min(100, (face_size / max_face_size) * 100)
-            self.root.after(0, lambda p=progress: self.progress_bar.config(value=p))
+            ui['progress_bar'] = round(min(100, (face_size / max_face_size) * 100))
             
             # Add text overlay
             cv2.putText(frame, f"LOCKED: {direction}", (10, 30), 
@@ -264,21 +383,32 @@ class FaceTrackerApp:
         else:
             # No faces detected
             if self.face_found:
-                self.root.after(0, lambda: self.status_label.config(text="Status: Lost Target - Scanning..."))
                 self.face_found = False
                 self.last_face_position = None
-                self.progress_bar['value'] = 0
-                self.root.after(0, lambda: self.direction_label.config(text="Scanning..."))
-                self.root.after(0, lambda: self.position_label.config(text="Not Found"))
+                ui['status_label'] = "Status: Lost Target - Scanning..."
+                ui['progress_bar'] = 0
+                ui['direction_label'] = "Scanning..."
+                ui['position_label'] = "Not Found"
             
             # Draw scanning indicator
-            frame_center = (frame.shape[1] // 2, frame.shape[0] // 2)
             cv2.circle(frame, frame_center, 20, (0, 0, 255), 2)
             cv2.putText(frame, "SCANNING", (10, 30), 
                        cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         
+        self.root.after_idle(self.apply_ui_updates, ui)
         return frame
     
+    def apply_ui_updates(self, ui):
+        """Apply widget updates from the camera thread, skipping unchanged values"""
+        for name, value in ui.items():
+            if self.ui_applied.get(name) == value:
+                continue
+            self.ui_applied[name] = value
+            if name == 'progress_bar':
+                self.progress_bar.config(value=value)
+            else:
+                getattr(self, name).config(text=value)
+    
     def calculate_direction(self, face_center, frame_center):
         """Calculate the direction of face relative to frame center"""
         fx, fy = face_center
@@ -302,30 +432,23 @@ class FaceTrackerApp:
             else:
                 return "UP"
     
-    def update_direction_info(self, direction, face_center, frame_center):
-        """Update direction and position information in UI"""
-        self.direction_label.config(text=f"Direction: {direction}")
-        
-        # Calculate distance from center
-        distance = ((face_center[0] - frame_center[0])**2 + (face_center[1] - frame_center[1])**2)**0.5
-        self.position_label.config(text=f"Position: ({face_center[0]}, {face_center[1]}) - Distance: {int(distance)}px")
-    
     def update_video_display(self, frame):
         """Update the video canvas with the processed frame"""
         try:
             # Convert OpenCV BGR to RGB
-            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=self.rgb_frame)
             
             # Convert to PIL Image
             pil_image = Image.fromarray(rgb_frame)
             
-            # Convert to Tkinter PhotoImage
-            photo = ImageTk.PhotoImage(image=pil_image)
+            # Only rebuild the PhotoImage if the camera delivers a different size
+            if (self.photo.width(), self.photo.height()) != pil_image.size:
+                self.photo = ImageTk.PhotoImage('RGB', pil_image.size)
+                self.video_canvas.itemconfig(self.canvas_image, image=self.photo)
+                self.video_canvas.config(width=frame.shape[1], height=frame.shape[0])
             
-            # Update canvas
-            self.video_canvas.config(width=frame.shape[1], height=frame.shape[0])
-            self.video_canvas.create_image(0, 0, anchor='nw', image=photo)
-            self.video_canvas.image = photo  # Keep reference to prevent garbage collection
+            # Repaint the existing canvas image in place
+            self.photo.paste(pil_image)
             
         except Exception as e:
             print(f"Error updating video display: {e}")
@@ -333,6 +456,7 @@ class FaceTrackerApp:
     def cleanup(self):
         """Clean up resources"""
         self.running = False
+        self.stop_event.set()
         if self.cap:
             self.cap.release()
         self.root.quit()
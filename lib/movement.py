@@ -19,7 +19,16 @@ class CarControl:
     def __init__(self, i2c_addr=0x18):
         """Initialize car control with error handling"""
         try:
-            self.mdev = mDEV(i2c_addr)
+            try:
+                self.mdev = mDEV(i2c_addr)
+            except (RuntimeError, OSError) as e:
+                # smbus2 imports fine on any Linux/macOS machine, so a missing
+                # /dev/i2c-1 only shows up here, when the bus is opened
+                if not HARDWARE_AVAILABLE:
+                    raise
+                from Server.mock_mdev import mDEV as MockMDEV
+                logger.warning(f"Could not open the I2C bus ({e}) - using mock hardware interface")
+                self.mdev = MockMDEV(i2c_addr)
             self.steering_angle = 100
             self.camera_pan = 90
             self.camera_tilt = 90
@@ -41,11 +50,8 @@ class CarControl:
             # direction lines are set the same way the old "backward" path used
             # to do. Keep the API name as forward, but flip the low-level bits
             # so the public controls match the real vehicle motion.
-            if not self.mdev.writeReg(self.mdev.CMD_DIR1, 1):
-                logger.error("Failed to set forward direction for right motor")
-                return False
-            if not self.mdev.writeReg(self.mdev.CMD_DIR2, 0):
-                logger.error("Failed to set forward direction for left motor")
+            if not self.mdev.writeRegsBatch([(self.mdev.CMD_DIR1, 1), (self.mdev.CMD_DIR2, 0)]):
+                logger.error("Failed to set forward direction for motors")
                 return False
             return True
         except Exception as e:
@@ -57,11 +63,8 @@ class CarControl:
         try:
             # See forward() above: the hardware directions are inverted from the
             # original names, so backward uses the opposite bit pattern.
-            if not self.mdev.writeReg(self.mdev.CMD_DIR1, 0):
-                logger.error("Failed to set backward direction for right motor")
-                return False
-            if not self.mdev.writeReg(self.mdev.CMD_DIR2, 1):
-                logger.error("Failed to set backward direction for left motor")
+            if not self.mdev.writeRegsBatch([(self.mdev.CMD_DIR1, 0), (self.mdev.CMD_DIR2, 1)]):
+                logger.error("Failed to set backward direction for motors")
                 return False
             return True
         except Exception as e:
@@ -71,11 +74,8 @@ class CarControl:
     def stop(self):
         """Stop the car"""
         try:
-            if not self.mdev.writeReg(self.mdev.CMD_PWM1, 0):
-                logger.error("Failed to stop right motor")
-                return False
-            if not self.mdev.writeReg(self.mdev.CMD_PWM2, 0):
-                logger.error("Failed to stop left motor")
+            if not self.mdev.writeRegsBatch([(self.mdev.CMD_PWM1, 0), (self.mdev.CMD_PWM2, 0)]):
+                logger.error("Failed to stop motors")
                 return False
             return True
         except Exception as e:
@@ -84,26 +84,50 @@ class CarControl:
 
 
 
+    def _speed_to_pwm(self, speed):
+        """Clamp a 0-100 speed, record it and return the motor PWM value (None if invalid)"""
+        if not isinstance(speed, (int, float)):
+            logger.error(f"Invalid speed type: {type(speed)}")
+            return None
+
+        speed = max(0, min(100, speed))  # Clamp speed to 0-100
+        self.current_speed = speed
+        return int(speed * 10)  # Convert to PWM value
+
     def set_speed(self, speed):
         """Set car speed (0-100)"""
         try:
-            if not isinstance(speed, (int, float)):
-                logger.error(f"Invalid speed type: {type(speed)}")
+            pwm = self._speed_to_pwm(speed)
+            if pwm is None:
                 return False
 
-            speed = max(0, min(100, speed))  # Clamp speed to 0-100
-            pwm = int(speed * 10)  # Convert to PWM value
-            self.current_speed = speed
+            if not self.mdev.writeRegsBatch([(self.mdev.CMD_PWM1, pwm), (self.mdev.CMD_PWM2, pwm)]):
+                logger.error("Failed to set speed for motors")
+                return False
+            return True
+        except Exception as e:
+            logger.error(f"Error setting speed: {e}")
+            return False
 
-            if not self.mdev.writeReg(self.mdev.CMD_PWM1, pwm):
-                logger.error("Failed to set speed for right motor")
+    def drive(self, speed, reverse=False):
+        """Set direction and speed (0-100) together in one bus transaction"""
+        try:
+            pwm = self._speed_to_pwm(speed)
+            if pwm is None:
                 return False
-            if not self.mdev.writeReg(self.mdev.CMD_PWM2, pwm):
-                logger.error("Failed to set speed for left motor")
+
+            # Same direction bits as forward()/backward(), sent ahead of the PWM
+            if not self.mdev.writeRegsBatch([
+                (self.mdev.CMD_DIR1, 0 if reverse else 1),
+                (self.mdev.CMD_DIR2, 1 if reverse else 0),
+                (self.mdev.CMD_PWM1, pwm),
+                (self.mdev.CMD_PWM2, pwm),
+            ]):
+                logger.error("Failed to set direction and speed for motors")
                 return False
             return True
         except Exception as e:
-            logger.error(f"Error setting speed: {e}")
+            logger.error(f"Error driving: {e}")
             return False
 
     def get_speed(self):
@@ -215,9 +239,8 @@ class CarControl:
         try:
             self.camera_pan = 90
             self.camera_tilt = 90
-            success = self.set_camera_pan(90)
-            success &= self.set_camera_tilt(90)
-            return success
+            # Skip the tilt write if the bus already rejected the pan write
+            return self.set_camera_pan(90) and self.set_camera_tilt(90)
         except Exception as e:
             logger.error(f"Error centering camera: {e}")
             return False
@@ -354,10 +377,7 @@ class CarControl:
     def led_all_off(self):
         """Turn all LEDs off"""
         try:
-            success = self.led_red_off()
-            success &= self.led_green_off()
-            success &= self.led_blue_off()
-            return success
+            return self.led_rgb(False, False, False)
         except Exception as e:
             logger.error(f"Error turning all LEDs off: {e}")
             return False
@@ -365,19 +385,12 @@ class CarControl:
     def led_rgb(self, r, g, b):
         """Set RGB LED colors (True/False for each color)"""
         try:
-            success = True
-            if r:
-                success &= self.led_red_on()
-            else:
-                success &= self.led_red_off()
-            if g:
-                success &= self.led_green_on()
-            else:
-                success &= self.led_green_off()
-            if b:
-                success &= self.led_blue_on()
-            else:
-                success &= self.led_blue_off()
+            # All three IO lines go out in a single transaction
+            success = self.mdev.setLed(r, g, b)
+            if success:
+                self.led_red_state = bool(r)
+                self.led_green_state = bool(g)
+                self.led_blue_state = bool(b)
             return success
         except Exception as e:
             logger.error(f"Error setting RGB LED: {e}")
@@ -408,25 +421,14 @@ class CarControl:
             left_speed = max(-1000, min(1000, left_speed))
             right_speed = max(-1000, min(1000, right_speed))
 
-            success = True
-
-            # Left motor
-            if left_speed >= 0:
-                success &= self.mdev.writeReg(self.mdev.CMD_DIR2, 1)
-                success &= self.mdev.writeReg(self.mdev.CMD_PWM2, abs(left_speed))
-            else:
-                success &= self.mdev.writeReg(self.mdev.CMD_DIR2, 0)
-                success &= self.mdev.writeReg(self.mdev.CMD_PWM2, abs(left_speed))
-
-            # Right motor (inverted for motor A)
-            if right_speed >= 0:
-                success &= self.mdev.writeReg(self.mdev.CMD_DIR1, 0)
-                success &= self.mdev.writeReg(self.mdev.CMD_PWM1, abs(right_speed))
-            else:
-                success &= self.mdev.writeReg(self.mdev.CMD_DIR1, 1)
-                success &= self.mdev.writeReg(self.mdev.CMD_PWM1, abs(right_speed))
-
-            return success
+            # Both motors are updated in one I2C transaction; the direction bit
+            # follows the sign, inverted for the right motor (motor A)
+            return self.mdev.writeRegsBatch([
+                (self.mdev.CMD_DIR2, int(left_speed >= 0)),
+                (self.mdev.CMD_PWM2, abs(left_speed)),
+                (self.mdev.CMD_DIR1, int(right_speed < 0)),
+                (self.mdev.CMD_PWM1, abs(right_speed)),
+            ])
         except Exception as e:
             logger.error(f"Error in advanced movement: {e}")
             return False
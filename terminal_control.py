@@ -53,11 +53,9 @@ class CarController:
             try:
                 # Handle movement - allow simultaneous forward/backward + steering
                 if self.moving_forward:
-                    self.car.forward()
-                    self.car.set_speed(self.current_speed)
+                    self.car.drive(self.current_speed)
                 elif self.moving_backward:
-                    self.car.backward()
-                    self.car.set_speed(self.current_speed)
+                    self.car.drive(self.current_speed, reverse=True)
                 else:
                     self.car.stop()
 
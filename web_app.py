@@ -1,11 +1,20 @@
-from flask import Flask, render_template, request, jsonify, Response
+from flask import Flask, request, jsonify, Response, send_from_directory
 from flask_cors import CORS
+import json
 import logging
+import os
 import cv2
 import time
 import threading
 from lib.movement import CarControl
 
+# Prefer a production WSGI server when one is installed
+try:
+    from waitress import serve
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
 app = Flask(__name__)
 CORS(app)
 
@@ -21,6 +30,21 @@ proximity_running = False
 # Autonomous mapping system
 mapper = None
 
+# Bumped whenever a control request may have changed the car status, so
+# /status_stream subscribers only get a push when there is something new.
+status_condition = threading.Condition()
+status_version = 0
+# Distinguishes this process's status versions from a previous run's, since
+# status_version restarts at 0 (see the /status ETag)
+BOOT_ID = os.urandom(4).hex()
+
+
+def notify_status_changed():
+    global status_version
+    with status_condition:
+        status_version += 1
+        status_condition.notify_all()
+
 
 class CameraStream:
     """Background camera reader that always keeps the latest frame.
@@ -33,11 +57,18 @@ class CameraStream:
     def __init__(self, index=0):
         self.index = index
         self.camera = None
-        self.lock = threading.Lock()
-        self.latest_frame = None
-        self.latest_frame_id = 0
-        self.running = False
+        # (frame, frame_id) published by the reader thread as one tuple, so
+        # viewers can take a consistent snapshot without locking.
+        self.latest = (None, 0)
+        self.stop_event = threading.Event()
         self.thread = None
+        # (width, height, quality) -> (frame_id, jpeg bytes), shared by all viewers
+        self.jpeg_lock = threading.Lock()
+        self.jpeg_cache = {}
+
+    @property
+    def running(self):
+        return self.thread is not None and not self.stop_event.is_set()
 
     def start(self):
         if self.running:
@@ -52,34 +83,58 @@ class CameraStream:
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         # Keep the capture buffer small so slow clients do not see a backlog.
         self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-        self.running = True
+        self.stop_event.clear()
         self.thread = threading.Thread(target=self._reader_loop, daemon=True)
         self.thread.start()
 
     def _reader_loop(self):
         try:
-            while self.running:
+            while not self.stop_event.is_set():
                 success, frame = self.camera.read()
                 if not success:
-                    time.sleep(0.05)
+                    self.stop_event.wait(0.05)
                     continue
 
-                with self.lock:
-                    self.latest_frame = frame
-                    self.latest_frame_id += 1
+                self.latest = (frame, self.latest[1] + 1)
         finally:
             if self.camera is not None:
                 self.camera.release()
                 self.camera = None
 
-    def get_latest_frame(self):
-        with self.lock:
-            if self.latest_frame is None:
-                return None, self.latest_frame_id
-            return self.latest_frame.copy(), self.latest_frame_id
+    def get_latest_jpeg(self, width, height, quality):
+        """Return the newest frame as JPEG bytes, encoding it once per size and quality."""
+        key = (width, height, quality)
+        with self.jpeg_lock:
+            # Take the snapshot under the lock so a viewer holding an older
+            # frame cannot overwrite a newer cache entry. The reader thread
+            # publishes a new array on every read and never writes into a
+            # published one, so no copy is needed here.
+            frame, frame_id = self.latest
+            if frame is None:
+                return None, frame_id
+
+            cached = self.jpeg_cache.get(key)
+            if cached is not None and cached[0] == frame_id:
+                return cached[1], frame_id
+
+            # Resize before JPEG encoding to keep the stream lighter on slow links.
+            if width > 0 and height > 0:
+                frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+            ret, buffer = cv2.imencode('.jpg', frame, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+            if not ret:
+                return None, frame_id
+
+            # Only a handful of viewer settings are expected; don't let odd
+            # query strings grow the cache without bound.
+            if key not in self.jpeg_cache and len(self.jpeg_cache) >= 4:
+                self.jpeg_cache.clear()
+            jpeg = buffer.tobytes()
+            self.jpeg_cache[key] = (frame_id, jpeg)
+            return jpeg, frame_id
 
     def stop(self):
-        self.running = False
+        self.stop_event.set()
         if self.thread and self.thread.is_alive():
             self.thread.join(timeout=1.0)
 
@@ -151,9 +206,12 @@ def generate_camera_feed(target_width=320, target_height=240, quality=55, fps=12
     last_frame_id = -1
     start_time = time.time()
 
+    quality = max(20, min(95, quality))
+
     while True:
-        frame, frame_id = stream.get_latest_frame()
-        if frame is None:
+        # Viewers with the same size and quality share one encode per frame.
+        jpeg, frame_id = stream.get_latest_jpeg(target_width, target_height, quality)
+        if frame_id == 0:
             if time.time() - start_time > 5:
                 raise RuntimeError("Camera did not provide frames in time")
             time.sleep(0.05)
@@ -165,31 +223,31 @@ def generate_camera_feed(target_width=320, target_height=240, quality=55, fps=12
             continue
 
         last_frame_id = frame_id
-
-        # Resize before JPEG encoding to keep the stream lighter on slow links.
-        if target_width > 0 and target_height > 0:
-            frame = cv2.resize(frame, (target_width, target_height), interpolation=cv2.INTER_AREA)
-
-        encode_params = [int(cv2.IMWRITE_JPEG_QUALITY), max(20, min(95, quality))]
-        ret, buffer = cv2.imencode('.jpg', frame, encode_params)
-        if not ret:
+        if jpeg is None:
             continue
 
         yield (b'--frame\r\n'
-               b'Content-Type: image/jpeg\r\n\r\n' + buffer.tobytes() + b'\r\n')
+               b'Content-Type: image/jpeg\r\n\r\n' + jpeg + b'\r\n')
 
         time.sleep(interval)
 
 
 
+def static_page(name):
+    """Serve a template with no Jinja variables as a plain file."""
+    # max_age=0 makes browsers revalidate on every load, so a deploy takes
+    # effect at once; unchanged pages still come back as a bodyless 304.
+    return send_from_directory(os.path.join(app.root_path, app.template_folder), name, max_age=0)
+
+
 @app.route('/')
 def index():
-    return render_template('index.html')
+    return static_page('index.html')
 
 
 @app.route('/joystick_video')
 def joystick_video():
-    return render_template('joystick_video.html')
+    return static_page('joystick_video.html')
 
 @app.route('/control/<action>', methods=['POST'])
 def control(action):
@@ -204,9 +262,9 @@ def control(action):
         success = False
 
         if action == 'forward':
-            success = car.forward() and car.set_speed(speed)
+            success = car.drive(speed)
         elif action == 'backward':
-            success = car.backward() and car.set_speed(speed)
+            success = car.drive(speed, reverse=True)
         elif action == 'stop':
             success = car.stop()
         elif action == 'turn_left':
@@ -229,6 +287,7 @@ def control(action):
         elif action == 'led_blue':
             success = car.led_blue_on() if data.get('state', True) else car.led_blue_off()
 
+        notify_status_changed()
         return jsonify({'success': success})
 
     except Exception as e:
@@ -250,12 +309,13 @@ def drive():
         if mode == 'stop':
             success = car.stop()
         elif mode == 'forward':
-            success = car.set_steering(angle) and car.forward() and car.set_speed(speed)
+            success = car.set_steering(angle) and car.drive(speed)
         elif mode == 'backward':
-            success = car.set_steering(angle) and car.backward() and car.set_speed(speed)
+            success = car.set_steering(angle) and car.drive(speed, reverse=True)
         else:
             return jsonify({'success': False, 'error': f'Unknown drive mode: {mode}'}), 400
 
+        notify_status_changed()
         return jsonify({'success': success})
 
     except Exception as e:
@@ -274,7 +334,6 @@ def emergency_stop():
         logger.warning("Emergency stop activated - car stopped")
 
         # Shut down the Flask app
-        import os
         logger.warning("Shutting down application...")
         os._exit(0)  # Force exit
 
@@ -304,9 +363,8 @@ def camera_feed():
     return Response(generate_camera_feed(width, height, quality, fps),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/status')
-def status():
-    return jsonify({
+def get_status():
+    return {
         'car_initialized': car is not None,
         'steering_angle': car.get_steering() if car else 0,
         'speed': car.get_speed() if car and hasattr(car, 'get_speed') else 0,
@@ -314,7 +372,40 @@ def status():
         'led_green': car.led_green_state if car and hasattr(car, 'led_green_state') else False,
         'led_blue': car.led_blue_state if car and hasattr(car, 'led_blue_state') else False,
         'buzzer_active': car.buzzer_state if car and hasattr(car, 'buzzer_state') else False
-    })
+    }
+
+
+@app.route('/status')
+def status():
+    # The status version doubles as an ETag so pollers that already hold the
+    # current status get a bodyless 304 instead of a fresh JSON snapshot.
+    etag = f"{BOOT_ID}-{status_version}"
+    if etag in request.if_none_match:
+        response = Response(status=304)
+    else:
+        response = jsonify(get_status())
+    response.set_etag(etag)
+    return response
+
+
+@app.route('/status_stream')
+def status_stream():
+    """Server-Sent Events feed that pushes the status whenever it changes."""
+    def generate():
+        seen_version = -1
+        while True:
+            with status_condition:
+                status_condition.wait_for(lambda: status_version != seen_version, timeout=15)
+                version = status_version
+            if version == seen_version:
+                # Comment line keeps proxies from timing out an idle stream
+                yield ': keepalive\n\n'
+                continue
+            seen_version = version
+            yield f"data: {json.dumps(get_status())}\n\n"
+
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 
 
@@ -325,4 +416,8 @@ if __name__ == '__main__':
     except Exception as e:
         logger.warning(f"Camera stream could not be initialized: {e}")
     logger.info("Starting web server on port 5000")
-    app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)
+    if WAITRESS_AVAILABLE:
+        # Camera and status streams each hold a worker thread while open
+        serve(app, host='0.0.0.0', port=5000, threads=16)
+    else:
+        app.run(host='0.0.0.0', port=5000, debug=False, threaded=True)